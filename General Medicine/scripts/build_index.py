@@ -3,11 +3,12 @@
 Extract text + pages from PDFs in data/raw, chunk them, build embeddings, and
 save an index under data/index/
 """
-import os, json, pathlib
+import os, sys, json, pathlib, hashlib
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict
 import numpy as np
+import faiss
 import fitz  # PyMuPDF
-from tqdm import tqdm
 from sentence_transformers import SentenceTransformer
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
@@ -18,15 +19,15 @@ PROC.mkdir(parents=True, exist_ok=True)
 IDX.mkdir(parents=True, exist_ok=True)
 
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-model = SentenceTransformer(MODEL_NAME)
 
 CHUNK_SIZE = 1200
 OVERLAP = 200
+PAGES_PER_TASK = 200  # big books are split so one PDF doesn't pin a single core
 
-def extract_pdf(pdf_path: pathlib.Path):
+def extract_pdf(pdf_path: pathlib.Path, first: int = 0, last: int = None):
     doc = fitz.open(pdf_path)
     rows = []
-    for pno in range(len(doc)):
+    for pno in range(first, min(len(doc), last or len(doc))):
         page = doc[pno]
         text = page.get_text("text") or ""
         if text.strip():
@@ -34,29 +35,99 @@ def extract_pdf(pdf_path: pathlib.Path):
     return rows
 
 def chunk_text(rows):
+    step = CHUNK_SIZE - OVERLAP
     chunks = []
     for r in rows:
         t = r["text"].strip()
         if not t:
             continue
-        start = 0
-        while start < len(t):
-            end = min(len(t), start + CHUNK_SIZE)
-            chunk = t[start:end]
-            chunks.append({"file": r["file"], "page": r["page"], "text": chunk})
-            start = end - OVERLAP
-            if start < 0:
-                start = 0
+        # the last window already covers the tail, so stop OVERLAP short of the end
+        chunks += [{"file": r["file"], "page": r["page"], "text": t[s:s + CHUNK_SIZE]}
+                   for s in range(0, max(len(t) - OVERLAP, 1), step)]
     return chunks
 
-def embed_texts(texts):
-    vecs = []
-    B = 64
-    for i in tqdm(range(0, len(texts), B), desc="Embedding"):
-        batch = texts[i:i+B]
-        emb = model.encode(batch, normalize_embeddings=True)
-        vecs.append(emb.astype(np.float32))
-    return np.vstack(vecs)
+def embed_texts(model, texts):
+    # sentence-transformers batches internally; one call avoids a per-batch
+    # Python loop and the extra full-size copy from np.vstack
+    X = model.encode(texts, batch_size=64, normalize_embeddings=True,
+                     convert_to_numpy=True, show_progress_bar=True)
+    return X.astype(np.float32, copy=False)
+
+def embed_cached(texts):
+    """Embed texts, reusing vectors of chunks already embedded by a previous run."""
+    cache_path = IDX / "emb_cache.npz"
+    hashes = [hashlib.sha1(t.encode("utf-8")).hexdigest() for t in texts]
+    known = {}
+    if cache_path.exists():
+        with np.load(cache_path) as z:
+            if str(z["model"]) == MODEL_NAME:
+                known = dict(zip(z["hashes"].tolist(), z["vecs"]))
+
+    missing = {h: t for h, t in zip(hashes, texts) if h not in known}
+    print(f"[embed] {len(set(hashes)) - len(missing)} cached, {len(missing)} new")
+    if missing:
+        # not loaded at import time, so spawned pool workers don't each load it
+        model = SentenceTransformer(MODEL_NAME)
+        known.update(zip(missing, embed_texts(model, list(missing.values()))))
+
+    # keep only vectors of current chunks so the cache doesn't grow without bound
+    live = list(dict.fromkeys(hashes))
+    np.savez(cache_path, model=np.array(MODEL_NAME), hashes=np.array(live),
+             vecs=np.stack([known[h] for h in live]))
+    return np.stack([known[h] for h in hashes]).astype(np.float32, copy=False)
+
+def fingerprint(pdf: pathlib.Path):
+    st = pdf.stat()
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+def extract_all(pdfs):
+    """Page rows per PDF; only files changed since the last run are re-extracted."""
+    manifest_path = PROC / "_manifest.json"
+    manifest = {}
+    if manifest_path.exists():
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    rows_by_pdf, stale = {}, []
+    for pdf in pdfs:
+        cached = PROC / f"{pdf.stem}.jsonl"
+        if manifest.get(pdf.name) == fingerprint(pdf) and cached.exists():
+            with open(cached, encoding="utf-8") as f:
+                rows_by_pdf[pdf] = [json.loads(l) for l in f]
+        else:
+            stale.append(pdf)
+    print(f"[extract] reused {len(pdfs) - len(stale)}, rebuilt {len(stale)}")
+
+    # extraction is CPU-bound and independent per page range: fan out over cores
+    tasks = []
+    for pdf in stale:
+        with fitz.open(pdf) as doc:
+            n = len(doc)
+        print(f"[extract] {pdf.name} ({n} pages)")
+        tasks += [(pdf, a, a + PAGES_PER_TASK) for a in range(0, n, PAGES_PER_TASK)]
+    if tasks:
+        with ProcessPoolExecutor() as ex:
+            for (pdf, _, _), rows in zip(tasks, ex.map(extract_pdf, *zip(*tasks))):
+                rows_by_pdf.setdefault(pdf, []).extend(rows)
+
+    for pdf in stale:
+        with open(PROC / f"{pdf.stem}.jsonl", "w", encoding="utf-8") as f:
+            for r in rows_by_pdf.get(pdf, []):
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        manifest[pdf.name] = fingerprint(pdf)
+    manifest = {p.name: manifest[p.name] for p in pdfs}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    return [rows_by_pdf.get(pdf, []) for pdf in pdfs]
+
+def corpus_signature(pdfs):
+    # everything the index depends on: source files plus model and chunking settings
+    h = hashlib.sha1(f"{MODEL_NAME}|{CHUNK_SIZE}|{OVERLAP}".encode("utf-8"))
+    for pdf in sorted(pdfs):
+        fp = fingerprint(pdf)
+        h.update(f"|{pdf.name}|{fp['mtime_ns']}|{fp['size']}".encode("utf-8"))
+    return h.hexdigest()
 
 def main():
     pdfs = list(RAW.glob("*.pdf"))
@@ -64,25 +135,41 @@ def main():
         print("No PDFs in data/raw.")
         return
 
+    sig = corpus_signature(pdfs)
+    sig_path = IDX / "signature.txt"
+    if ("--force" not in sys.argv and sig_path.exists()
+            and sig_path.read_text().strip() == sig and (IDX / "hnsw.faiss").exists()):
+        print("✅ Index up to date → data/index/ (use --force to rebuild)")
+        return
+
     all_chunks = []
-    for pdf in pdfs:
-        print(f"[extract] {pdf.name}")
-        rows = extract_pdf(pdf)
-        chunks = chunk_text(rows)
-        all_chunks.extend(chunks)
+    for rows in extract_all(pdfs):
+        all_chunks.extend(chunk_text(rows))
+
+    # bail out before touching data/index/ so an earlier build stays consistent
+    texts = [r["text"] for r in all_chunks]
+    if not texts:
+        print("No text extracted from data/raw.")
+        return
+    print(f"[index] {len(texts)} chunks")
+    X = embed_cached(texts)
 
     meta_path = IDX / "meta.jsonl"
     with open(meta_path, "w", encoding="utf-8") as f:
         for r in all_chunks:
             f.write(json.dumps(r, ensure_ascii=False) + "\n")
-
-    texts = [r["text"] for r in all_chunks]
-    print(f"[index] {len(texts)} chunks")
-    X = embed_texts(texts)
-
     np.save(IDX / "embeddings.npy", X)
+    # int8 copies written by older builds; nothing reads them any more
+    for stale in ("embeddings_i8.npy", "scale.npy"):
+        (IDX / stale).unlink(missing_ok=True)
+    # HNSW graph for sub-linear search (inner product == cosine on unit vectors)
+    hnsw = faiss.IndexHNSWFlat(X.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+    hnsw.hnsw.efConstruction = 200
+    hnsw.add(X)
+    faiss.write_index(hnsw, str(IDX / "hnsw.faiss"))
     with open(IDX / "model.txt", "w") as f:
         f.write(MODEL_NAME)
+    sig_path.write_text(sig)
 
     print("✅ Index built → data/index/")
 
@@ -5,7 +5,9 @@ Update the ASSETS list if you add more files to the release.
 """
 import os
 import pathlib
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
 ASSETS = [
@@ -19,19 +21,29 @@ ASSETS = [
 DEST = pathlib.Path(__file__).resolve().parents[1] / "data" / "raw"
 DEST.mkdir(parents=True, exist_ok=True)
 
-for url in ASSETS:
+def fetch(session, url, position=0):
     name = url.split("/")[-1]
     out = DEST / name
     if out.exists() and out.stat().st_size > 1024:
         print(f"[skip] {name} already exists")
-        continue
+        return
     print(f"[download] {name}")
-    with requests.get(url, stream=True) as r:
+    part = out.with_name(name + ".part")  # a failed download must not look complete
+    with session.get(url, stream=True, timeout=60) as r:
         r.raise_for_status()
         total = int(r.headers.get("content-length", 0))
-        with open(out, "wb") as f, tqdm(total=total, unit="B", unit_scale=True) as pbar:
+        with open(part, "wb") as f, tqdm(total=total, unit="B", unit_scale=True,
+                                         desc=name, position=position) as pbar:
             for chunk in r.iter_content(chunk_size=1024 * 1024):
                 if chunk:
                     f.write(chunk)
                     pbar.update(len(chunk))
+    part.replace(out)
+
+# One pooled session and all assets in flight at once, instead of a fresh
+# connection per file fetched one after another.
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_maxsize=len(ASSETS)))
+with ThreadPoolExecutor(max_workers=len(ASSETS)) as ex:
+    list(ex.map(fetch, [session] * len(ASSETS), ASSETS, range(len(ASSETS))))
 print("Done. Files saved to data/raw/")
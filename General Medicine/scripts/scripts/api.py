@@ -2,16 +2,25 @@
 # FastAPI wrapper around your local embeddings index.
 # Start with:
 #   uvicorn scripts.api:app --host 0.0.0.0 --port 8000 --reload
+# Several workers (model loaded once in the master, shared copy-on-write):
+#   gunicorn scripts.api:app -k uvicorn.workers.UvicornWorker -w 4 --preload
 
-import os, json, pathlib
+import os, pathlib, functools
 from typing import List, Dict, Any
 import numpy as np
+import orjson
+import faiss
 from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 
+try:
+    from .embedding import get_model, embed_query
+except ImportError:
+    from embedding import get_model, embed_query
+
 load_dotenv()
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
@@ -34,30 +43,73 @@ def auth(authorization: str = Header(default="")):
 if not (IDX / "embeddings.npy").exists():
     raise RuntimeError("No index found. Run scripts/build_index.py first.")
 
-EMB = np.load(IDX / "embeddings.npy")  # [N, D]
-meta_lines = [json.loads(l) for l in open(IDX / "meta.jsonl", "r", encoding="utf-8")]
-MODEL_NAME = open(IDX / "model.txt", "r").read().strip()
-model = SentenceTransformer(MODEL_NAME)
+# mmap: pages are read on demand and shared via the OS page cache across workers
+EMB = np.load(IDX / "embeddings.npy", mmap_mode="r")  # [N, D] float32
 
-def top_k(query: str, k: int = 5) -> List[Dict[str, Any]]:
-    q = model.encode([query], normalize_embeddings=True).astype(np.float32)[0]
+# Approximate search when build_index.py produced an HNSW graph; the
+# brute-force scan below stays as the fallback for older indexes.
+HNSW = None
+if (IDX / "hnsw.faiss").exists():
+    # IO_FLAG_MMAP_IFC maps the file (vectors and graph) like EMB, so workers
+    # share it via the page cache; plain IO_FLAG_MMAP still copies an HNSWFlat.
+    # Older faiss releases lack the flag and get a regular in-memory read.
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap_flag is not None:
+        HNSW = faiss.read_index(str(IDX / "hnsw.faiss"), mmap_flag)
+    else:
+        HNSW = faiss.read_index(str(IDX / "hnsw.faiss"))
+    HNSW.hnsw.efSearch = 128
+with open(IDX / "meta.jsonl", "rb") as f:
+    meta_lines = [orjson.loads(l) for l in f]
+with open(IDX / "model.txt", "r") as f:
+    MODEL_NAME = f.read().strip()
+model = get_model(MODEL_NAME)
+
+def make_snippet(text: str, limit: int = 600) -> str:
+    snippet = text.strip().replace("\n", " ")
+    if len(snippet) > limit:
+        # end on a word boundary rather than mid-word
+        cut = snippet.rfind(" ", 0, limit + 1)
+        snippet = snippet[:cut if cut > 0 else limit].rstrip() + " …"
+    return snippet
+
+# short snippets for the UI, built once instead of per hit per request; the
+# full chunk text is never returned, so it is not kept in memory
+for r in meta_lines:
+    r["snippet"] = make_snippet(r.pop("text"))
+
+def search(q: np.ndarray, k: int):
+    if HNSW is not None:
+        D, I = HNSW.search(q[None, :], k)
+        keep = I[0] >= 0  # faiss pads with -1 when fewer than k hits
+        return D[0][keep], I[0][keep]
     sims = EMB @ q
-    idx = np.argsort(-sims)[:k]
+    if k < len(sims):
+        # O(N) partial selection, then sort only the k survivors
+        part = np.argpartition(-sims, k)[:k]
+        idx = part[np.argsort(-sims[part])]
+    else:
+        idx = np.argsort(-sims)
+    return sims[idx], idx
+
+def top_k(query: str, k: int = 5) -> List[Dict[str, Any]]:
+    q = embed_query(model, query)
+    scores, idx = search(q, k)
     out = []
-    for i in idx:
-        r = dict(meta_lines[i])  # file, page, text
-        r["score"] = float(sims[i])
-        # short snippet for UI
-        snippet = (r["text"].strip().replace("\n", " "))
-        if len(snippet) > 600:
-            snippet = snippet[:600] + " …"
-        r["snippet"] = snippet
-        del r["text"]
+    for score, i in zip(scores, idx):
+        r = dict(meta_lines[i])  # file, page, snippet
+        r["score"] = float(score)
         out.append(r)
     return out
 
+@functools.lru_cache(maxsize=512)
+def top_k_cached(query: str, k: int):
+    # the index is read-only for the life of the process, so results never go stale
+    return tuple(top_k(query, k))
+
 # --- FastAPI app ---
-app = FastAPI(title="Personal Assistant Medical Search API")
+# orjson is already a dependency (meta loading); use it for responses too
+app = FastAPI(title="Personal Assistant Medical Search API", default_response_class=ORJSONResponse)
 
 # CORS for your website (replace with your domain when deployed)
 origins = os.getenv("CORS_ORIGINS", "*").split(",")
@@ -85,5 +137,5 @@ def health():
 def api_search(body: SearchIn):
     if not body.query.strip():
         raise HTTPException(status_code=400, detail="Empty query")
-    results = top_k(body.query.strip(), k=max(1, min(body.k, 20)))
+    results = list(top_k_cached(body.query.strip(), max(1, min(body.k, 20))))
     return {"query": body.query, "results": results}
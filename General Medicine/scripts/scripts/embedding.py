@@ -0,0 +1,35 @@
+"""
+Embedding model shared by the search API and the CLI.
+The model is loaded once per process; run the API under gunicorn with
+--preload so workers inherit it copy-on-write instead of loading their own.
+
+EMBED_BACKEND=onnx runs the encoder through ONNX Runtime using the fp32
+export shipped with the model, so query vectors match the torch-built index
+up to float rounding. FP16/BF16 is not used: ONNX Runtime's CPU provider has
+few half-precision kernels and falls back to casts. EMBED_ONNX_FILE can pick
+a reduced-precision export (e.g. onnx/model_qint8_avx2.onnx); its agreement
+with the torch index has not been measured, so check recall before using it.
+"""
+import os, functools, threading
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_ONNX_FILE = os.getenv("EMBED_ONNX_FILE", "onnx/model.onnx")
+
+_LOCK = threading.Lock()
+
+@functools.lru_cache(maxsize=1)
+def _load(name: str) -> SentenceTransformer:
+    if EMBED_BACKEND == "onnx":
+        return SentenceTransformer(name, backend="onnx",
+                                   model_kwargs={"file_name": EMBED_ONNX_FILE})
+    return SentenceTransformer(name)
+
+def get_model(name: str) -> SentenceTransformer:
+    # the lock stops concurrent first calls from loading the weights twice
+    with _LOCK:
+        return _load(name)
+
+def embed_query(model: SentenceTransformer, text: str) -> np.ndarray:
+    return model.encode([text], normalize_embeddings=True).astype(np.float32)[0]
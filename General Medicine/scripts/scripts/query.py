@@ -4,22 +4,39 @@ Local semantic search with citations.
 Usage:
   python scripts/query.py "clinical question"
 """
-import sys, json, pathlib
+import sys, pathlib
 import numpy as np
-from sentence_transformers import SentenceTransformer
+import orjson
+import faiss
+from embedding import get_model, embed_query
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 IDX = ROOT / "data" / "index"
 
-EMB = np.load(IDX / "embeddings.npy")
-meta_lines = [json.loads(l) for l in open(IDX / "meta.jsonl", encoding="utf-8")]
-MODEL_NAME = open(IDX / "model.txt").read().strip()
-model = SentenceTransformer(MODEL_NAME)
+EMB = np.load(IDX / "embeddings.npy", mmap_mode="r")
+with open(IDX / "meta.jsonl", "rb") as f:
+    meta_lines = [orjson.loads(l) for l in f]
+with open(IDX / "model.txt") as f:
+    MODEL_NAME = f.read().strip()
+model = get_model(MODEL_NAME)
+
+HNSW = None
+if (IDX / "hnsw.faiss").exists():
+    HNSW = faiss.read_index(str(IDX / "hnsw.faiss"))
+    HNSW.hnsw.efSearch = 128
 
 def top_k(query, k=5):
-    q = model.encode([query], normalize_embeddings=True).astype(np.float32)[0]
+    q = embed_query(model, query)
+    if HNSW is not None:
+        D, I = HNSW.search(q[None, :], k)
+        return [(float(s), meta_lines[i]) for s, i in zip(D[0], I[0]) if i >= 0]
     sims = EMB @ q
-    idx = np.argsort(-sims)[:k]
+    if k < len(sims):
+        # O(N) partial selection, then sort only the k survivors
+        part = np.argpartition(-sims, k)[:k]
+        idx = part[np.argsort(-sims[part])]
+    else:
+        idx = np.argsort(-sims)
     return [(float(sims[i]), meta_lines[i]) for i in idx]
 
 if __name__ == "__main__":
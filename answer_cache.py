@@ -0,0 +1,52 @@
+"""
+In-memory answer cache for the clinical Q&A routes.
+
+Only exact re-asks are served: the same question up to case and whitespace.
+Questions that differ by a single word or digit (CKD stage 3 vs 5, type 1 vs
+type 2 diabetes) look near-identical to any surface-similarity measure but
+need different answers, so there is deliberately no fuzzy matching.
+"""
+import collections
+import hashlib
+import threading
+import time
+
+
+def _key(question):
+    # fixed 16-byte key however long the question; case and spacing ignored
+    norm = " ".join(question.lower().split())
+    return hashlib.blake2b(norm.encode("utf-8"), digest_size=16).digest()
+
+
+class AnswerCache:
+    def __init__(self, ttl=300, maxsize=256):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()  # (namespace, question digest) -> (answer, ts)
+        self._lock = threading.Lock()
+
+    def get(self, namespace, question):
+        if self.maxsize <= 0:
+            return None
+        key = (namespace, _key(question))
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                return None
+            if now - hit[1] >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return hit[0]
+
+    def put(self, namespace, question, answer):
+        if self.maxsize <= 0:
+            return
+        key = (namespace, _key(question))
+        with self._lock:
+            self._entries[key] = (answer, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                # evict the least recently used entry
+                self._entries.popitem(last=False)
@@ -1,8 +1,17 @@
 import os
+import functools
+import hashlib
+import threading
+import orjson
 import requests
-from flask import Flask, request, jsonify, render_template
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
+from flask.json.provider import JSONProvider
 from dotenv import load_dotenv
 
+from answer_cache import AnswerCache
+
 load_dotenv()
 
 API_KEY = os.getenv("DEEPSEEK_API_KEY") or os.getenv("OPENAI_API_KEY")
@@ -12,11 +21,112 @@ DEEPSEEK_URL = "https://api.deepseek.com/v1/chat/completions"
 if not API_KEY:
     raise RuntimeError("Missing DEEPSEEK_API_KEY in .env")
 
-app = Flask(__name__, template_folder="templates")
+class OrjsonProvider(JSONProvider):
+    """jsonify / get_json via orjson, which writes UTF-8 bytes directly."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
+app = Flask(__name__, template_folder="templates/templates")
+app.json = OrjsonProvider(app)
+
+# Serve exact re-asks (case/whitespace aside) without another DeepSeek round-trip
+ANSWER_CACHE = AnswerCache(
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "300")),
+    maxsize=int(os.getenv("ANSWER_CACHE_SIZE", "256")),
+)
+
+# Cap in-flight DeepSeek calls per process; requests beyond that wait briefly
+# for a slot and are then turned away instead of piling up on the upstream.
+# The cap is per worker, so the server-wide bound is workers x this. It must
+# sit below the worker's thread count (gunicorn.conf.py) to ever bite.
+LLM_MAX_CONCURRENCY = int(os.getenv(
+    "LLM_MAX_CONCURRENCY", max(1, int(os.getenv("GUNICORN_THREADS", "16")) // 2)
+))
+LLM_SLOTS = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+LLM_SLOT_WAIT = float(os.getenv("LLM_SLOT_WAIT", "10"))
+BUSY = {"error": "Server busy, please try again shortly."}
+
+RETRY_AFTER_MAX = float(os.getenv("LLM_RETRY_AFTER_MAX", "5"))
+
+class LLMRetry(Retry):
+    # the wait holds an LLM slot, so honour Retry-After only up to a few seconds
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, RETRY_AFTER_MAX)
+
+# One pooled session per process: calls reuse kept-alive TLS connections to
+# DeepSeek instead of handshaking each time. Rate limits and gateway errors
+# are retried before the caller sees them; read timeouts never are, since the
+# completion may already be generating (and billed) upstream.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_maxsize=LLM_MAX_CONCURRENCY,
+    max_retries=LLMRetry(
+        total=2, connect=2, read=False, backoff_factor=0.5,
+        status_forcelist=(429, 502, 503),
+        allowed_methods=frozenset({"POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    ),
+))
+# sent on every call; json= bodies set their own Content-Type
+SESSION.headers["Authorization"] = f"Bearer {API_KEY}"
+
+SYSTEM_PROMPT = (
+    "You are a clinical Q&A engine for Australian doctors. "
+    "Give one structured, high-yield answer with markdown headings:\n"
+    "1. Overview\n"
+    "2. Assessment\n"
+    "3. Risk Stratification\n"
+    "4. Management (stepwise, first/second-line, standard doses)\n"
+    "5. Monitoring & Follow-up\n"
+    "6. Red Flags / Escalation\n"
+    "7. Key References (guidelines, major trials)\n"
+    "Rules: evidence/guideline-based; say when uncertain, never fabricate data; "
+    "assume adults and Australian context unless stated.\n"
+    "End every answer with: 'Always verify with local policies, product information, and senior review before acting.'"
+)
+
+def deepseek_payload(question, stream=False):
+    return {
+        "model": MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": question},
+        ],
+        "temperature": 0.3,
+        "max_tokens": 900,
+        "stream": stream,
+    }
+
+def sse(obj):
+    return b"data: " + orjson.dumps(obj) + b"\n\n"
+
+@functools.lru_cache(maxsize=1)
+def home_page():
+    # static page (no template variables): render and encode it once per process
+    body = render_template("index.html").encode("utf-8")
+    return body, hashlib.sha1(body).hexdigest()
 
 @app.route("/")
 def home():
-    return render_template("index.html")
+    if app.debug:
+        return render_template("index.html")
+    body, etag = home_page()
+    resp = Response(body, mimetype="text/html")
+    # revalidate on every visit, but unchanged pages come back as a bodyless 304
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
 
 @app.route("/api/clinical-qa", methods=["POST"])
 def clinical_qa():
@@ -26,42 +136,14 @@ def clinical_qa():
     if not question:
         return jsonify({"error": "No clinical question received."}), 400
 
-    system_prompt = (
-        "You are a clinical question-to-answer engine for doctors in Australia. "
-        "Return a single, structured, high-yield answer per query.\n\n"
-        "Format your response with clear markdown headings:\n"
-        "1. Overview\n"
-        "2. Assessment\n"
-        "3. Risk Stratification\n"
-        "4. Management (stepwise, include first-line, second-line, doses if standard)\n"
-        "5. Monitoring & Follow-up\n"
-        "6. Red Flags / When to escalate\n"
-        "7. Key References (guidelines / major trials only)\n\n"
-        "Rules:\n"
-        "- Base answers on accepted evidence & guidelines.\n"
-        "- If uncertain, say so; do NOT fabricate data.\n"
-        "- Assume adult patients unless specified.\n"
-        "- Assume Australian context if relevant.\n"
-        "- End every answer with: 'Always verify with local policies, product information, and senior review before acting.'"
-    )
+    cached = ANSWER_CACHE.get("clinical-qa", question)
+    if cached is not None:
+        return jsonify({"answer": cached, "cached": True})
 
+    if not LLM_SLOTS.acquire(timeout=LLM_SLOT_WAIT):
+        return jsonify(BUSY), 503
     try:
-        payload = {
-            "model": MODEL,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": question},
-            ],
-            "temperature": 0.3,
-            "max_tokens": 900,
-        }
-
-        headers = {
-            "Authorization": f"Bearer {API_KEY}",
-            "Content-Type": "application/json",
-        }
-
-        resp = requests.post(DEEPSEEK_URL, json=payload, headers=headers, timeout=60)
+        resp = SESSION.post(DEEPSEEK_URL, json=deepseek_payload(question), timeout=(5, 60))
 
         if resp.status_code != 200:
             return jsonify({
@@ -70,12 +152,91 @@ def clinical_qa():
                 "body": resp.text,
             }), 500
 
-        data = resp.json()
-        answer = data["choices"][0]["message"]["content"].strip()
+        data = orjson.loads(resp.content)
+        choice = data["choices"][0]
+        answer = choice["message"]["content"].strip()
+        if choice.get("finish_reason") != "stop":
+            # cut off at max_tokens or filtered: flag it, never cache it
+            return jsonify({"answer": answer, "truncated": True})
+        ANSWER_CACHE.put("clinical-qa", question, answer)
         return jsonify({"answer": answer})
 
     except Exception as e:
         return jsonify({"error": "Server exception", "details": str(e)}), 500
+    finally:
+        LLM_SLOTS.release()
+
+@app.route("/api/clinical-qa-stream", methods=["POST"])
+def clinical_qa_stream():
+    # POST only: questions must not end up in URLs or access logs
+    data = request.get_json(silent=True) or {}
+    question = (data.get("question") or "").strip()
+
+    if not question:
+        return jsonify({"error": "No clinical question received."}), 400
+
+    def generate():
+        cached = ANSWER_CACHE.get("clinical-qa", question)
+        if cached is not None:
+            yield sse({"delta": cached})
+            yield sse({"done": True, "cached": True})
+            return
+
+        if not LLM_SLOTS.acquire(timeout=LLM_SLOT_WAIT):
+            yield sse(BUSY)
+            return
+        parts = []
+        finish_reason = None
+        done_seen = False
+        try:
+            with SESSION.post(DEEPSEEK_URL, json=deepseek_payload(question, stream=True),
+                              stream=True, timeout=(5, 60)) as resp:
+                if resp.status_code != 200:
+                    yield sse({
+                        "error": "DeepSeek API error",
+                        "status": resp.status_code,
+                        "body": resp.text,
+                    })
+                    return
+
+                # upstream is SSE too: "data: {chunk}" lines, terminated by "data: [DONE]"
+                for line in resp.iter_lines():
+                    if not line.startswith(b"data:"):
+                        continue
+                    chunk = line[5:].strip()
+                    if chunk == b"[DONE]":
+                        done_seen = True
+                        break
+                    choices = orjson.loads(chunk).get("choices") or []
+                    if not choices:
+                        continue
+                    finish_reason = choices[0].get("finish_reason") or finish_reason
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        parts.append(delta)
+                        yield sse({"delta": delta})
+
+        except Exception as e:
+            yield sse({"error": "Server exception", "details": str(e)})
+            return
+        finally:
+            LLM_SLOTS.release()
+
+        # cut off at max_tokens, filtered, or the stream ended early: tell the
+        # client, and never cache a partial clinical answer
+        if not (done_seen and finish_reason == "stop"):
+            yield sse({"done": True, "truncated": True})
+            return
+        if parts:
+            ANSWER_CACHE.put("clinical-qa", question, "".join(parts).strip())
+        yield sse({"done": True})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # dev server only; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(host="0.0.0.0", port=5000, debug=os.getenv("FLASK_DEBUG") == "1")
@@ -0,0 +1,15 @@
+# Picked up automatically by `gunicorn app:app` from the working directory.
+# Each request mostly waits on DeepSeek, so gthread workers let one process
+# hold many in-flight calls; tune per host with the env vars below.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "gthread"
+# the work is I/O-bound, so capacity comes from threads, not processes; each
+# worker also keeps its own answer cache and LLM_MAX_CONCURRENCY slots
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+
+# import the app once in the master; workers share those pages
+# copy-on-write instead of importing their own
+preload_app = True
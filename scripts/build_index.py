@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
-import os, re, sys, io, hashlib, tempfile, shutil, requests, yaml
+import os, re, sys, io, hashlib, tempfile, shutil, multiprocessing, requests, yaml
 from datetime import datetime
+from email.utils import formatdate
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from whoosh import index
 from whoosh.fields import Schema, TEXT, ID, DATETIME
-from pypdf import PdfReader
+import fitz  # PyMuPDF
 
 ROOT = os.path.dirname(os.path.abspath(__file__))
 REPO_ROOT = os.path.abspath(os.path.join(ROOT, ".."))
@@ -24,14 +26,16 @@ schema = Schema(
 )
 
 def open_or_create_index(path):
-    from whoosh import index as windex
     if os.path.isdir(path) and os.listdir(path):
-        return windex.open_dir(path)
+        return index.open_dir(path)
     os.makedirs(path, exist_ok=True)
-    return windex.create_in(path, schema)
+    return index.create_in(path, schema)
+
+SENT_SPLIT = re.compile(r"(?<=[.!?])\s+")
+HSPACE = re.compile(r"[ \t]+")
 
 def chunk_text(txt, max_chars=1600):
-    sents = re.split(r"(?<=[\\.!?])\\s+", txt.strip())
+    sents = SENT_SPLIT.split(txt.strip())
     out, cur, cur_len = [], [], 0
     for s in sents:
         L = len(s)
@@ -48,31 +52,50 @@ def download(url, to_dir):
     name = url.split("/")[-1] or "file.pdf"
     if not name.lower().endswith(".pdf"):
         name += ".pdf"
+    # downloads run concurrently: keep same-named files from different sites apart
+    name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8] + "_" + name
     path = os.path.join(to_dir, name)
-    with requests.get(url, stream=True, timeout=60) as r:
+    headers = {}
+    if os.path.exists(path):
+        # copy from an earlier run: only fetch it again if the source changed
+        headers["If-Modified-Since"] = formatdate(os.path.getmtime(path), usegmt=True)
+    with requests.get(url, stream=True, timeout=60, headers=headers) as r:
+        if r.status_code == 304:
+            return path
         r.raise_for_status()
-        with open(path, "wb") as f:
+        with open(path + ".part", "wb") as f:
             for chunk in r.iter_content(65536):
                 if chunk:
                     f.write(chunk)
+    os.replace(path + ".part", path)
     return path
 
 def pdf_text(path):
-    reader = PdfReader(path)
     pages = []
-    for p in reader.pages:
-        t = p.extract_text() or ""
-        t = re.sub(r"[ \\t]+", " ", t)
-        pages.append(t)
-    return "\\n".join(pages)
-
-def ingest(ix, path, title, org="", published=""):
+    with fitz.open(path) as doc:
+        for p in doc:
+            t = p.get_text("text") or ""
+            t = HSPACE.sub(" ", t)
+            pages.append(t)
+    return "\n".join(pages)
+
+def pdf_chunks(path):
+    cache = path + ".txt"
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+        with open(cache, "r", encoding="utf-8") as f:
+            txt = f.read()
+    else:
+        txt = pdf_text(path)
+        with open(cache + ".part", "w", encoding="utf-8") as f:
+            f.write(txt)
+        os.replace(cache + ".part", cache)
+    return chunk_text(txt, 2000)
+
+def ingest(ix, chunks, title, org="", published=""):
     try:
         dt = datetime.fromisoformat(published) if published else datetime.utcnow()
     except Exception:
         dt = datetime.utcnow()
-    txt = pdf_text(path)
-    chunks = chunk_text(txt, 2000)
     basehash = hashlib.sha1(title.encode("utf-8")).hexdigest()[:8]
     w = ix.writer()
     for i, c in enumerate(chunks):
@@ -100,16 +123,27 @@ def main():
     ix = open_or_create_index(INDEX_DIR)
     total_chunks = 0
 
+    entries = []
     for s in sources:
         url = s.get("url"); title = s.get("title") or url
         org = s.get("org") or ""; published = s.get("published") or ""
         if not url:
             print("[!] Skipping an entry without url"); continue
-        print(f"[+] {title} — {org} ({published})")
-        path = download(url, DL_DIR)
-        n = ingest(ix, path, title, org, published)
-        total_chunks += n
-        print(f"    ✓ {n} chunks")
+        entries.append((url, title, org, published))
+
+    # downloads are network-bound and extraction CPU-bound: each PDF goes to
+    # the process pool as soon as it lands; the index writer stays serial.
+    # forkserver: extraction workers must not be forked from this process
+    # while download threads are mid-request
+    mp_ctx = multiprocessing.get_context("forkserver")
+    with ThreadPoolExecutor(max_workers=8) as dl, ProcessPoolExecutor(mp_context=mp_ctx) as px:
+        paths = dl.map(lambda e: download(e[0], DL_DIR), entries)
+        chunk_futs = [px.submit(pdf_chunks, path) for path in paths]
+        for (url, title, org, published), fut in zip(entries, chunk_futs):
+            print(f"[+] {title} — {org} ({published})")
+            n = ingest(ix, fut.result(), title, org, published)
+            total_chunks += n
+            print(f"    ✓ {n} chunks")
 
     print(f"[OK] Built index at data/indexdir with {total_chunks} chunks")
 